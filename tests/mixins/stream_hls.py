@@ -1,6 +1,6 @@
 import unittest
 from binascii import hexlify
-from functools import partial
+from functools import lru_cache, partial
 from threading import Event, Thread
 from typing import List
 from unittest.mock import patch
@@ -49,12 +49,14 @@ class Tag(HLSItemBase):
         self.name = name
         self.attrs = attrs
 
-    @classmethod
-    def val_quoted_string(cls, value):
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def val_quoted_string(value):
         return "\"{0}\"".format(value)
 
-    @classmethod
-    def val_hex(cls, value):
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def val_hex(value):
         return "0x{0}".format(hexlify(value).decode("ascii"))
 
     def build(self, *args, **kwargs):
@@ -1,13 +1,13 @@
 import os
 import typing
 import unittest
+from functools import lru_cache
 from threading import Event
 from unittest.mock import Mock, call, patch
 
 import pytest
 import requests_mock
 from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad
 from requests.exceptions import InvalidSchema
 
 from streamlink.session import Streamlink
@@ -17,6 +17,16 @@ from tests.mixins.stream_hls import EventedHLSStreamWriter, Playlist, Segment, T
 from tests.resources import text
 
 
+AES_BLOCK_SIZE = 16
+BYTES_COMPLEMENT = bytes(b ^ 0xFF for b in range(256))
+
+
+@lru_cache(maxsize=None)
+def read_playlist(path: str) -> str:
+    with text(path) as pl:
+        return pl.read()
+
+
 class EncryptedBase:
     content: bytes
     content_plain: bytes
@@ -25,7 +35,10 @@ class EncryptedBase:
         super().__init__(num, *args, **kwargs)
         aesCipher = AES.new(key, AES.MODE_CBC, iv)
         content = self.content if content is None else content
-        padded = content + padding if padding else pad(content, AES.block_size, style="pkcs7")
+        if not padding:
+            padlen = AES_BLOCK_SIZE - len(content) % AES_BLOCK_SIZE
+            padding = bytes([padlen]) * padlen
+        padded = content + padding
         self.content_plain = content
         self.content = aesCipher.encrypt(padded) + append
 
@@ -44,13 +57,17 @@ class TagMapEnc(EncryptedBase, TagMap):
     pass
 
 
+def _tag_key_uri(tag, namespace):
+    return tag.val_quoted_string(tag.url(namespace))
+
+
 class TagKey(Tag):
     path = "encryption.key"
 
     def __init__(self, method="NONE", uri=None, iv=None, keyformat=None, keyformatversions=None):
         attrs = {"METHOD": method}
         if uri is not False:  # pragma: no branch
-            attrs["URI"] = lambda tag, namespace: tag.val_quoted_string(tag.url(namespace))
+            attrs["URI"] = _tag_key_uri
         if iv is not None:  # pragma: no branch
             attrs["IV"] = self.val_hex(iv)
         if keyformat is not None:  # pragma: no branch
@@ -69,8 +86,14 @@ class SegmentEnc(EncryptedBase, Segment):
 
 
 class TestHLSStreamRepr(unittest.TestCase):
+    session: Streamlink
+
+    @classmethod
+    def setUpClass(cls):
+        cls.session = Streamlink()
+
     def test_repr(self):
-        session = Streamlink()
+        session = self.session
 
         stream = HLSStream(session, "https://foo.bar/playlist.m3u8")
         assert repr(stream) == "<HLSStream ['hls', 'https://foo.bar/playlist.m3u8']>"
@@ -80,20 +103,31 @@ class TestHLSStreamRepr(unittest.TestCase):
 
 
 class TestHLSVariantPlaylist(unittest.TestCase):
+    session: Streamlink
+    mocker: requests_mock.Mocker
+
+    @classmethod
+    def setUpClass(cls):
+        cls.session = Streamlink()
+        cls.mocker = requests_mock.Mocker()
+        cls.mocker.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mocker.stop()
+
     @classmethod
     def get_master_playlist(cls, playlist):
-        with text(playlist) as pl:
-            return pl.read()
+        return read_playlist(playlist)
 
     def subject(self, playlist, options=None):
-        with requests_mock.Mocker() as mock:
-            url = f"http://mocked/{self.id()}/master.m3u8"
-            content = self.get_master_playlist(playlist)
-            mock.get(url, text=content)
+        url = f"http://mocked/{self.id()}/master.m3u8"
+        content = self.get_master_playlist(playlist)
+        self.mocker.get(url, text=content)
 
-            session = Streamlink(options)
+        session = Streamlink(options) if options else self.session
 
-            return HLSStream.parse_variant_playlist(session, url)
+        return HLSStream.parse_variant_playlist(session, url)
 
     def test_variant_playlist(self):
         streams = self.subject("hls/test_master.m3u8")
@@ -110,8 +144,7 @@ class TestHLSVariantPlaylist(unittest.TestCase):
         assert stream.url_master == f"{base}/master.m3u8"
 
     def test_url_master(self):
-        session = Streamlink()
-        stream = HLSStream(session, "http://mocked/foo", url_master="http://mocked/master.m3u8")
+        stream = HLSStream(self.session, "http://mocked/foo", url_master="http://mocked/master.m3u8")
 
         assert stream.multivariant is None
         assert stream.url == "http://mocked/foo"
@@ -149,8 +182,9 @@ class TestHLSStream(TestMixinStreamHLS, unittest.TestCase):
 
         data = self.await_read(read_all=True)
         assert data == self.content(segments, cond=lambda s: 0 < s.num < 3), "Respects the offset and duration"
-        assert all(self.called(s) for s in segments.values() if 0 < s.num < 3), "Downloads second and third segment"
-        assert not any(self.called(s) for s in segments.values() if 0 > s.num > 3), "Skips other segments"
+        called = {num: self.called(s) for num, s in segments.items()}
+        assert all(called[num] for num in called if 0 < num < 3), "Downloads second and third segment"
+        assert not any(called[num] for num in called if not 0 < num < 3), "Skips other segments"
 
     def test_map(self):
         discontinuity = Tag("EXT-X-DISCONTINUITY")
@@ -241,11 +275,14 @@ class TestHLSStreamByterange(TestMixinStreamHLS, unittest.TestCase):
         assert not self.called(Segment(2))
 
     def test_offsets(self):
-        map1 = TagMap(1, self.id(), {"BYTERANGE": "\"1234@0\""})
-        map2 = TagMap(2, self.id(), {"BYTERANGE": "\"42@1337\""})
-        self.mock("GET", self.url(map1), content=map1.content)
-        self.mock("GET", self.url(map2), content=map2.content)
+        namespace = self.id()
+        map1 = TagMap(1, namespace, {"BYTERANGE": "\"1234@0\""})
+        map2 = TagMap(2, namespace, {"BYTERANGE": "\"42@1337\""})
         s1, s2, s3, s4, s5 = Segment(0), Segment(1), Segment(2), Segment(3), Segment(4)
+        url_map1, url_map2 = map1.url(namespace), map2.url(namespace)
+        url_s1, url_s2, url_s3, url_s4, url_s5 = (s.url(namespace) for s in (s1, s2, s3, s4, s5))
+        self.mock("GET", url_map1, content=map1.content)
+        self.mock("GET", url_map2, content=map2.content)
 
         self.subject([
             Playlist(0, [
@@ -261,13 +298,13 @@ class TestHLSStreamByterange(TestMixinStreamHLS, unittest.TestCase):
 
         self.await_write(5 * 2)
         self.await_read(read_all=True)
-        assert self.mocks[self.url(map1)].last_request._request.headers["Range"] == "bytes=0-1233"
-        assert self.mocks[self.url(map2)].last_request._request.headers["Range"] == "bytes=1337-1378"
-        assert self.mocks[self.url(s1)].last_request._request.headers["Range"] == "bytes=3-7"
-        assert self.mocks[self.url(s2)].last_request._request.headers["Range"] == "bytes=8-14"
-        assert self.mocks[self.url(s3)].last_request._request.headers["Range"] == "bytes=15-25"
-        assert self.mocks[self.url(s4)].last_request._request.headers["Range"] == "bytes=13-29"
-        assert self.mocks[self.url(s5)].last_request._request.headers["Range"] == "bytes=30-48"
+        assert self.mocks[url_map1].last_request._request.headers["Range"] == "bytes=0-1233"
+        assert self.mocks[url_map2].last_request._request.headers["Range"] == "bytes=1337-1378"
+        assert self.mocks[url_s1].last_request._request.headers["Range"] == "bytes=3-7"
+        assert self.mocks[url_s2].last_request._request.headers["Range"] == "bytes=8-14"
+        assert self.mocks[url_s3].last_request._request.headers["Range"] == "bytes=15-25"
+        assert self.mocks[url_s4].last_request._request.headers["Range"] == "bytes=13-29"
+        assert self.mocks[url_s5].last_request._request.headers["Range"] == "bytes=30-48"
 
 
 @patch("streamlink.stream.hls.HLSStreamWorker.wait", Mock(return_value=True))
@@ -356,8 +393,8 @@ class TestHLSStreamEncrypted(TestMixinStreamHLS, unittest.TestCase):
 
         # noinspection PyTypeChecker
         thread, segments = self.subject([
-            Playlist(0, [key] + [SegmentEnc(num, aesKey, aesIv) for num in range(0, 4)]),
-            Playlist(4, [key] + [SegmentEnc(num, aesKey, aesIv, content=long) for num in range(4, 8)], end=True),
+            Playlist(0, [key, *(SegmentEnc(num, aesKey, aesIv) for num in range(0, 4))]),
+            Playlist(4, [key, *(SegmentEnc(num, aesKey, aesIv, content=long) for num in range(4, 8))], end=True),
         ])
 
         self.await_write(3 + 4)
@@ -368,8 +405,9 @@ class TestHLSStreamEncrypted(TestMixinStreamHLS, unittest.TestCase):
         assert data == expected, "Decrypts the AES-128 identity stream"
         assert self.called(key, once=True), "Downloads encryption key only once"
         assert self.get_mock(key).last_request._request.headers.get("X-FOO") == "BAR"
-        assert not any(self.called(s) for s in segments.values() if s.num < 1), "Skips first segment"
-        assert all(self.called(s) for s in segments.values() if s.num >= 1), "Downloads all remaining segments"
+        called = {num: self.called(s) for num, s in segments.items()}
+        assert not any(called[num] for num in called if num < 1), "Skips first segment"
+        assert all(called[num] for num in called if num >= 1), "Downloads all remaining segments"
         assert self.get_mock(segments[1]).last_request._request.headers.get("X-FOO") == "BAR"
 
     def test_hls_encrypted_aes128_with_map(self):
@@ -381,8 +419,8 @@ class TestHLSStreamEncrypted(TestMixinStreamHLS, unittest.TestCase):
 
         # noinspection PyTypeChecker
         thread, segments = self.subject([
-            Playlist(0, [key, map1] + [SegmentEnc(num, aesKey, aesIv) for num in range(0, 2)]),
-            Playlist(2, [key, map2] + [SegmentEnc(num, aesKey, aesIv) for num in range(2, 4)], end=True),
+            Playlist(0, [key, map1, *(SegmentEnc(num, aesKey, aesIv) for num in range(0, 2))]),
+            Playlist(2, [key, map2, *(SegmentEnc(num, aesKey, aesIv) for num in range(2, 4))], end=True),
         ])
 
         self.await_write(2 * 2 + 2 * 2)
@@ -395,13 +433,13 @@ class TestHLSStreamEncrypted(TestMixinStreamHLS, unittest.TestCase):
 
     def test_hls_encrypted_aes128_key_uri_override(self):
         aesKey, aesIv, key = self.gen_key(uri="http://real-mocked/{namespace}/encryption.key?foo=bar")
-        aesKeyInvalid = bytes(ord(aesKey[i:i + 1]) ^ 0xFF for i in range(16))
+        aesKeyInvalid = aesKey.translate(BYTES_COMPLEMENT)
         _, __, key_invalid = self.gen_key(aesKeyInvalid, aesIv, uri="http://mocked/{namespace}/encryption.key?foo=bar")
 
         # noinspection PyTypeChecker
         thread, segments = self.subject([
-            Playlist(0, [key_invalid] + [SegmentEnc(num, aesKey, aesIv) for num in range(0, 4)]),
-            Playlist(4, [key_invalid] + [SegmentEnc(num, aesKey, aesIv) for num in range(4, 8)], end=True),
+            Playlist(0, [key_invalid, *(SegmentEnc(num, aesKey, aesIv) for num in range(0, 4))]),
+            Playlist(4, [key_invalid, *(SegmentEnc(num, aesKey, aesIv) for num in range(4, 8))], end=True),
         ], options={"hls-segment-key-uri": "{scheme}://real-{netloc}{path}?{query}"})
 
         self.await_write(3 + 4)
@@ -441,7 +479,7 @@ class TestHLSStreamEncrypted(TestMixinStreamHLS, unittest.TestCase):
     def test_hls_encrypted_aes128_incorrect_padding_length(self, mock_log: Mock):
         aesKey, aesIv, key = self.gen_key()
 
-        padding = b"\x00" * (AES.block_size - len(b"[0]"))
+        padding = b"\x00" * (AES_BLOCK_SIZE - len(b"[0]"))
         thread, segments = self.subject([
             Playlist(0, [
                 key,
@@ -463,7 +501,7 @@ class TestHLSStreamEncrypted(TestMixinStreamHLS, unittest.TestCase):
     def test_hls_encrypted_aes128_incorrect_padding_content(self, mock_log: Mock):
         aesKey, aesIv, key = self.gen_key()
 
-        padding = (b"\x00" * (AES.block_size - len(b"[0]") - 1)) + bytes([AES.block_size])
+        padding = (b"\x00" * (AES_BLOCK_SIZE - len(b"[0]") - 1)) + bytes([AES_BLOCK_SIZE])
         thread, segments = self.subject([
             Playlist(0, [
                 key,
@@ -635,9 +673,8 @@ class TestHlsExtAudio:
 
     @pytest.fixture(autouse=True)
     def _playlist(self):
-        with text("hls/test_2.m3u8") as playlist, \
-             requests_mock.Mocker() as mock_requests:
-            mock_requests.get("http://mocked/path/master.m3u8", text=playlist.read())
+        with requests_mock.Mocker() as mock_requests:
+            mock_requests.get("http://mocked/path/master.m3u8", text=read_playlist("hls/test_2.m3u8"))
             yield
 
     @pytest.fixture()
@@ -681,8 +718,6 @@ class TestM3U8ParserLogging:
         caplog.set_level(loglevel, "streamlink")
 
         parser = M3U8Parser()
-        with text("hls/test_1.m3u8") as pl:
-            data = pl.read()
-        parser.parse(data)
+        parser.parse(read_playlist("hls/test_1.m3u8"))
 
         assert bool(caplog.records) is has_logs